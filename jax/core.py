@@ -16,17 +16,18 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from operator import attrgetter
 from contextlib import contextmanager
 from collections import namedtuple, Counter, defaultdict
 from weakref import ref
+import itertools as it
 import threading
 import types
 
 import six
+from six.moves import builtins
 
 from . import linear_util as lu
-from .util import safe_zip, safe_map, partial, curry
+from .util import safe_zip, safe_map, partial, curry, cache
 from .pprint_util import pp, vcat, hcat, pp_kv_pairs
 
 # TODO(dougalm): the trace cache breaks the leak detector. Consisder solving.
@@ -36,20 +37,36 @@ skip_checks = True  # not __debug__  # google doesn't use -O
 
 zip = safe_zip
 map = safe_map
+_zip = builtins.zip
 
 
 # -------------------- jaxprs --------------------
 
 class Jaxpr(object):
+  # Jaxprs are immutable once built: the fields are tuples, and the compiled
+  # program and printed form are cached in the remaining slots.
+  __slots__ = ['constvars', 'freevars', 'invars', 'outvars', 'eqns',
+               '_compiled', '_str', '_python_fun']
+
   def __init__(self, constvars, freevars, invars, outvars, eqns):
-    self.constvars = list(constvars)
-    self.freevars = list(freevars)
-    self.invars = list(invars)
-    self.outvars = list(outvars)
-    self.eqns = list(eqns)
+    self.constvars = tuple(constvars)
+    self.freevars = tuple(freevars)
+    self.invars = tuple(invars)
+    self.outvars = tuple(outvars)
+    self.eqns = tuple(eqns)
+    self._compiled = None
+    self._str = None
+    self._python_fun = None
+
+  def _compile(self):
+    if self._compiled is None:
+      self._compiled = compile_jaxpr(self)
+    return self._compiled
 
   def __str__(self):
-    return str(pp_jaxpr(self))
+    if self._str is None:
+      self._str = str(pp_jaxpr(self))
+    return self._str
   __repr__ = __str__
 
 class TypedJaxpr(object):
@@ -71,7 +88,7 @@ class TypedJaxpr(object):
 
   def __str__(self):
     # TODO(mattjj): improve this with type annotations?
-    return str(pp_jaxpr(self.jaxpr))
+    return str(self.jaxpr)
   __repr__ = __str__
 
 @curry
@@ -91,13 +108,10 @@ class Literal(object):
   def __init__(self, val):
     self.val = val
     try:
-      self.hash = hash(val)
-    except TypeError:
-      if type(val) in literalable_types:
-        try:
-          self.hash = hash((val.item(), val.dtype))
-        except (TypeError, AttributeError):
-          self.hash = None
+      hasher = _literal_hashers[type(val)]
+    except KeyError:
+      hasher = _literal_hasher(val)
+    self.hash = hasher(val)
 
   def __hash__(self):
     return id(self.val) if self.hash is None else self.hash
@@ -113,8 +127,46 @@ class Literal(object):
 
 literalable_types = set()
 
+# Maps each literalable type to the function Literal uses to hash its values,
+# so that the common unhashable case (e.g. 0-d ndarrays) doesn't go through a
+# raised TypeError on every Literal construction.
+_literal_hashers = {}
+
+def _literal_hasher(val):
+  t = type(val)
+  if t not in literalable_types:
+    return _try_hash  # hashability of other types can depend on the value
+  try:
+    hash(val)
+  except TypeError:
+    hasher = _hash_item_and_dtype
+  else:
+    hasher = hash
+  _literal_hashers[t] = hasher
+  return hasher
+
+def _hash_item_and_dtype(val):
+  try:
+    return hash((val.item(), val.dtype))
+  except (TypeError, AttributeError):
+    return None
+
+def _try_hash(val):
+  try:
+    return hash(val)
+  except TypeError:
+    return None
+
+def _is_hashable(args, kwargs):
+  try:
+    hash((args, tuple(kwargs.items())))
+  except TypeError:
+    return False
+  return True
+
 class Primitive(object):
   multiple_results = False  # override for multi-output primitives
+  _result_cache = None  # set by enable_result_cache
 
   def __init__(self, name):
     self.name = name
@@ -127,7 +179,7 @@ class Primitive(object):
                               or valid_jaxtype(arg) for arg in args), args
     top_trace = find_top_trace(args)
     if top_trace is None:
-      return self.impl(*args, **kwargs)
+      return self._impl_or_cached(args, kwargs)
 
     tracers = map(top_trace.full_raise, args)
     out_tracer = top_trace.process_primitive(self, tracers, kwargs)
@@ -136,10 +188,48 @@ class Primitive(object):
     else:
       return full_lower(out_tracer)
 
+  def bind_many(self, args_list, **params):
+    """Binds this primitive to each argument tuple in `args_list`.
+
+    Equivalent to `[self.bind(*args, **params) for args in args_list]`, except
+    that the top trace is found once for the whole batch and the raised
+    tracers are handed to `Trace.process_primitive_many` together.
+    """
+    if 'bind' in self.__dict__:  # custom bind
+      return [self.bind(*args, **params) for args in args_list]
+
+    top_trace = find_top_trace(it.chain.from_iterable(args_list))
+    if top_trace is None:
+      return [self._impl_or_cached(args, params) for args in args_list]
+
+    tracers_list = [map(top_trace.full_raise, args) for args in args_list]
+    outs = top_trace.process_primitive_many(self, tracers_list, params)
+    if self.multiple_results:
+      return [map(full_lower, out) for out in outs]
+    else:
+      return map(full_lower, outs)
+
+  def _impl_or_cached(self, args, kwargs):
+    # Hashability is checked up front so that a TypeError raised by impl itself
+    # is not mistaken for an unhashable argument.
+    if self._result_cache is not None and _is_hashable(args, kwargs):
+      return self._result_cache(*args, **kwargs)
+    return self.impl(*args, **kwargs)
+
   def def_impl(self, impl):
     self.impl = impl
     return impl
 
+  def enable_result_cache(self, max_size=128):
+    """Memoizes `impl` on hashable arguments when bound on concrete values.
+
+    Only appropriate for pure primitives. Calls with unhashable arguments (e.g.
+    ndarrays) fall through to `impl`. Arguments are keyed by type as well as
+    value, so e.g. `bind(1, 2)` and `bind(1., 2.)` are cached separately. Must
+    be called after `def_impl`.
+    """
+    self._result_cache = cache(max_size, typed=True)(self.impl)
+
   def def_abstract_eval(self, abstract_eval):
     self.abstract_eval = abstract_eval
     return abstract_eval
@@ -148,6 +238,16 @@ class Primitive(object):
     self.bind = bind
     return bind
 
+  def def_pass_through(self):
+    """Makes a single-operand primitive a no-op at every level.
+
+    Binding it returns the operand itself, without looking for a top trace or
+    building tracers. Since it never reaches a trace, it never appears in a
+    jaxpr either.
+    """
+    self.def_impl(_pass_through)
+    self.def_custom_bind(_pass_through)
+
   def impl(self, *args, **kwargs):
     raise NotImplementedError("Evaluation rule for '{}' not implemented"
                               .format(self.name))
@@ -156,38 +256,155 @@ class Primitive(object):
     raise NotImplementedError("Abstract evaluation for '{}' not implemented"
                               .format(self.name))
 
+def _pass_through(x):
+  return x
+
 
 # -------------------- lifting --------------------
 
 
-def eval_jaxpr(jaxpr, consts, freevar_vals, *args):
-  def read(v):
+CompiledJaxpr = namedtuple('CompiledJaxpr', ['init_env', 'constvars', 'freevars',
+                                             'invars', 'outvars', 'program'])
+
+def compile_jaxpr(jaxpr):
+  """Lowers `jaxpr` to a flat instruction stream over a list environment.
+
+  Each variable is assigned a slot in a list-backed environment. The indices
+  are kept in a table local to the jaxpr rather than on the variables, since
+  the same variable objects can be bound by several jaxprs (see e.g.
+  `partial_eval.closure_convert_jaxpr`). Slot 0 always holds `unit`, and each
+  Literal gets its own slot prefilled with its value, so reading an input is
+  plain list indexing.
+
+  Each equation becomes a record
+  `(bind, in_idx, out_idx, params, multiple_results, subprograms)`, where
+  `subprograms` pairs the compiled form of each bound subjaxpr with the slots
+  of its const and freevar bindings. Use `Jaxpr._compile` to get the cached
+  result.
+  """
+  init_env = [unit]
+  index = {unitvar: 0}
+  def slot(v):
     if type(v) is Literal:
-      return v.val
+      init_env.append(v.val)
+      return len(init_env) - 1
     else:
-      return env[v]
+      return index[v]
 
-  def write(v, val):
-    env[v] = val
+  def bind(v):
+    index[v] = len(init_env)
+    init_env.append(None)
+    return index[v]
 
-  env = {}
-  write(unitvar, unit)
-  map(write, jaxpr.constvars, consts)
-  map(write, jaxpr.invars, args)
-  map(write, jaxpr.freevars, freevar_vals)
+  constvars = tuple(map(bind, jaxpr.constvars))
+  freevars = tuple(map(bind, jaxpr.freevars))
+  invars = tuple(map(bind, jaxpr.invars))
+  program = []
   for eqn in jaxpr.eqns:
-    in_vals = map(read, eqn.invars)
-    subfuns = [partial(eval_jaxpr, subjaxpr, map(read, const_bindings),
-                                             map(read, freevar_bindings))
-               for subjaxpr, const_bindings, freevar_bindings
-               in eqn.bound_subjaxprs]
-    subfuns = map(lu.wrap_init, subfuns)
-    ans = eqn.primitive.bind(*(subfuns + in_vals), **eqn.params)
-    if eqn.primitive.multiple_results:
-      map(write, eqn.outvars, ans)
+    in_idx = tuple(map(slot, eqn.invars))
+    subprograms = tuple((subjaxpr._compile(), tuple(map(slot, const_bindings)),
+                         tuple(map(slot, freevar_bindings)))
+                        for subjaxpr, const_bindings, freevar_bindings
+                        in eqn.bound_subjaxprs)
+    out_idx = tuple(map(bind, eqn.outvars))
+    program.append((eqn.primitive.bind, in_idx, out_idx, eqn.params,
+                    eqn.primitive.multiple_results, subprograms))
+  outvars = tuple(map(slot, jaxpr.outvars))
+  return CompiledJaxpr(tuple(init_env), constvars, freevars, invars, outvars,
+                       tuple(program))
+
+
+def eval_jaxpr(jaxpr, consts, freevar_vals, *args):
+  return eval_compiled_jaxpr(jaxpr._compile(), consts, freevar_vals, *args)
+
+def eval_compiled_jaxpr(compiled, consts, freevar_vals, *args):
+  # Lengths are checked once here; the loop below uses the unchecked builtin
+  # zip rather than safe_zip.
+  assert len(consts) == len(compiled.constvars)
+  assert len(freevar_vals) == len(compiled.freevars)
+  assert len(args) == len(compiled.invars)
+  env = list(compiled.init_env)
+  for i, val in _zip(compiled.constvars, consts):
+    env[i] = val
+  for i, val in _zip(compiled.invars, args):
+    env[i] = val
+  for i, val in _zip(compiled.freevars, freevar_vals):
+    env[i] = val
+  for bind, in_idx, out_idx, params, multiple_results, subprograms \
+      in compiled.program:
+    in_vals = [_make_subfun(subprogram, [env[i] for i in const_idx],
+                            [env[i] for i in freevar_idx])
+               for subprogram, const_idx, freevar_idx in subprograms]
+    in_vals.extend(env[i] for i in in_idx)
+    ans = bind(*in_vals, **params)
+    if multiple_results:
+      assert skip_checks or len(ans) == len(out_idx)
+      for i, val in _zip(out_idx, ans):
+        env[i] = val
     else:
-      write(eqn.outvars[0], ans)
-  return map(read, jaxpr.outvars)
+      env[out_idx[0]] = ans
+  return [env[i] for i in compiled.outvars]
+
+def _make_subfun(subprogram, consts, freevar_vals):
+  # A plain closure rather than util.partial, which pays for
+  # functools.update_wrapper on every call.
+  def eval_jaxpr(*args):
+    return eval_compiled_jaxpr(subprogram, consts, freevar_vals, *args)
+  return lu.wrap_init(eval_jaxpr)
+
+
+def jaxpr_to_python(jaxpr):
+  """Returns a Python function evaluating `jaxpr` as straight-line code.
+
+  The function has the signature of `partial(eval_jaxpr, jaxpr)`. It is
+  generated from the compiled form of `jaxpr`, with each environment slot
+  turned into a local variable and each equation into a single call to its
+  primitive's `bind`, so evaluating it involves no interpreter loop. Bound
+  subjaxprs are still evaluated with `eval_compiled_jaxpr`.
+
+  Generating the function costs more than one `eval_jaxpr` call, so this is
+  meant for jaxprs that are evaluated many times. The result is cached on the
+  jaxpr.
+  """
+  if jaxpr._python_fun is None:
+    jaxpr._python_fun = _compiled_to_python(jaxpr._compile())
+  return jaxpr._python_fun
+
+def _compiled_to_python(compiled):
+  names = ['x{}'.format(i) for i in range(len(compiled.init_env))]
+  def names_list(idx):
+    return '[{}]'.format(', '.join(names[i] for i in idx))
+
+  namespace = {'_make_subfun': _make_subfun}
+  bound = set(it.chain(compiled.constvars, compiled.freevars, compiled.invars))
+  lines = ['def jaxpr_fun(consts, freevar_vals, *args):',
+           '  {} = consts'.format(names_list(compiled.constvars)),
+           '  {} = freevar_vals'.format(names_list(compiled.freevars)),
+           '  {} = args'.format(names_list(compiled.invars))]
+  for n, (bind, in_idx, out_idx, params, multiple_results, subprograms) \
+      in enumerate(compiled.program):
+    namespace['bind{}'.format(n)] = bind
+    namespace['params{}'.format(n)] = params
+    in_vals = []
+    for k, (subprogram, const_idx, freevar_idx) in enumerate(subprograms):
+      namespace['sub{}_{}'.format(n, k)] = subprogram
+      in_vals.append('_make_subfun(sub{}_{}, {}, {})'.format(
+          n, k, names_list(const_idx), names_list(freevar_idx)))
+    in_vals.extend(names[i] for i in in_idx)
+    lhs = names_list(out_idx) if multiple_results else names[out_idx[0]]
+    # operands are splatted from a list, since Python < 3.7 rejects calls with
+    # more than 255 explicit arguments
+    lines.append('  {} = bind{}(*[{}], **params{})'.format(
+        lhs, n, ', '.join(in_vals), n))
+    bound.update(out_idx)
+  lines.append('  return {}'.format(names_list(compiled.outvars)))
+
+  # unit and Literal slots are read as globals of the generated function
+  for i, val in enumerate(compiled.init_env):
+    if i not in bound:
+      namespace[names[i]] = val
+  six.exec_('\n'.join(lines), namespace)
+  return namespace['jaxpr_fun']
 
 
 def full_lower(val):
@@ -198,19 +415,23 @@ def full_lower(val):
 
 
 def find_top_trace(xs):
- try:
-   top_trace = max((x.trace for x in xs if isinstance(x, Tracer)),
-                   key=attrgetter('level'))
- except ValueError:
-   return None
- else:
-   return type(top_trace)(top_trace.master, cur_sublevel())
+  # A single pass over xs, and no Trace is built at all in the common case
+  # where every value is concrete.
+  top = None
+  for x in xs:
+    if isinstance(x, Tracer) and (top is None or x.trace.level > top.level):
+      top = x.trace
+  if top is None:
+    return None
+  return type(top)(top.master, cur_sublevel())
 
 
 # -------------------- tracing --------------------
 
 
 class Trace(object):
+  __slots__ = ['master', 'level', 'sublevel']
+
   def __init__(self, master, sublevel):
     self.master = master
     self.level = master.level
@@ -242,6 +463,10 @@ class Trace(object):
       raise Exception("Can't lift {} to {}".format(val, self))
 
 
+  def process_primitive_many(self, primitive, tracers_list, params):
+    return [self.process_primitive(primitive, tracers, params)
+            for tracers in tracers_list]
+
   def pure(self, val):
     assert False
 
@@ -256,6 +481,11 @@ class Trace(object):
         self.__class__.__name__, self.level, self.sublevel)
 
 
+if six.PY3:
+  _make_method = types.MethodType
+else:
+  _make_method = lambda fun, self: types.MethodType(fun, self, None)
+
 class Tracer(object):
   __array_priority__ = 1000
   __slots__ = ['trace', '__weakref__']
@@ -331,22 +561,21 @@ class Tracer(object):
     # if the aval property raises an AttributeError, gets caught here
     assert skip_checks or name != "aval"
 
-    try:
-      attr = getattr(self.aval, name)
-    except KeyError:
-      raise AttributeError(
-          "{} has no attribute {}".format(self.__class__.__name__, name))
+    aval = self.aval
+    forward = _aval_forwards.get((type(aval), name))
+    if forward is not None:
+      return forward(self)
+
+    attr = getattr(aval, name)
+    t = type(attr)
+    if t is aval_property:
+      forward = attr.fget
+    elif t is aval_method:
+      forward = lambda tracer: _make_method(attr.fun, tracer)
     else:
-      t = type(attr)
-      if t is aval_property:
-        return attr.fget(self)
-      elif t is aval_method:
-        if six.PY3:
-          return types.MethodType(attr.fun, self)
-        else:
-          return types.MethodType(attr.fun, self, None)
-      else:
-        return attr
+      return attr
+    _aval_forwards[(type(aval), name)] = forward
+    return forward(self)
 
   def __repr__(self):
     return 'Traced<{}>with<{}>'.format(self.aval, self.trace)
@@ -357,8 +586,14 @@ class Tracer(object):
 aval_property = namedtuple("aval_property", ["fget"])
 aval_method = namedtuple("aval_method", ["fun"])
 
+# memoizes the Tracer forwarding functions for aval_property and aval_method
+# attributes, keyed by (aval type, attribute name)
+_aval_forwards = {}
+
 
 class MasterTrace(object):
+  __slots__ = ['level', 'trace_type', '__weakref__']
+
   def __init__(self, level, trace_type):
     self.level = level
     self.trace_type = trace_type
@@ -377,24 +612,32 @@ class TraceStack(object):
   def __init__(self):
     self.upward = []
     self.downward = []
+    # stack depths, kept alongside the lists since next_level is on the
+    # call_bind path
+    self.num_upward = 0
+    self.num_downward = 0
 
   def next_level(self, bottom):
     if bottom:
-      return - (len(self.downward) + 1)
+      return - (self.num_downward + 1)
     else:
-      return len(self.upward)
+      return self.num_upward
 
   def push(self, val, bottom):
     if bottom:
       self.downward.append(val)
+      self.num_downward += 1
     else:
       self.upward.append(val)
+      self.num_upward += 1
 
   def pop(self, bottom):
     if bottom:
       self.downward.pop()
+      self.num_downward -= 1
     else:
       self.upward.pop()
+      self.num_upward -= 1
 
   def __repr__(self):
     return  'Trace stack\n{} ---\n{}'.format(
@@ -404,13 +647,18 @@ class TraceStack(object):
 
 class Sublevel(int): pass
 
+# Sublevels are bounded by the nesting depth of calls, so the common ones are
+# preallocated and shared rather than built on every new_sublevel.
+_sublevels = [Sublevel(i) for i in range(256)]
+
 # The global state of the tracer is accessed by a thread-local object.
 # This allows concurrent tracing in separate threads; passing traced objects
-# between threads is forbidden.
+# between threads is forbidden. Each access to its attributes is a
+# thread-local lookup, so hot paths read them into locals once.
 class TraceState(threading.local):
   def __init__(self):
     self.trace_stack = TraceStack()
-    self.substack = [Sublevel(0)]
+    self.substack = [_sublevels[0]]
 
 trace_state = TraceState()
 
@@ -421,31 +669,34 @@ def cur_sublevel():
 
 @contextmanager
 def new_master(trace_type, bottom=False):
-  level = trace_state.trace_stack.next_level(bottom)
+  stack = trace_state.trace_stack
+  level = stack.next_level(bottom)
   master = MasterTrace(level, trace_type)
-  trace_state.trace_stack.push(master, bottom)
+  stack.push(master, bottom)
 
   try:
     yield master
   finally:
-    trace_state.trace_stack.pop(bottom)
+    stack.pop(bottom)
 
   if check_leaks:
     t = ref(master)
     del master
     if t() is not None:
-      print(trace_state.trace_stack)
+      print(stack)
       raise Exception('Leaked trace {}'.format(t()))
 
 
 @contextmanager
 def new_sublevel():
-  sublevel = Sublevel(len(trace_state.substack))
-  trace_state.substack.append(sublevel)
+  substack = trace_state.substack
+  n = len(substack)
+  sublevel = _sublevels[n] if n < len(_sublevels) else Sublevel(n)
+  substack.append(sublevel)
   try:
     yield
   finally:
-    trace_state.substack.pop()
+    substack.pop()
 
   if check_leaks:
     t = ref(sublevel)
@@ -470,11 +721,14 @@ class AbstractValue(object):
       return self.__class__.__name__
 
 
-class Bot(AbstractValue): pass
+class Bot(AbstractValue):
+  __slots__ = []
 
 bot = Bot()
 
 class AbstractUnit(AbstractValue):
+  __slots__ = []
+
   def join(self, other): return self
   def _eq(self, self_traced, other): return get_aval(other) is self
 
@@ -531,15 +785,16 @@ unitvar = UnitVar()
 pytype_aval_mappings[Unit] = lambda _: abstract_unit
 
 identity_p = Primitive('id')
-identity_p.def_impl(lambda x: x)
-identity_p.def_custom_bind(lambda x: x)
+identity_p.def_pass_through()
 
 # ------------------- Call -------------------
 
 
 def apply_todos(todos, outs):
-  while todos:
-    outs = map(full_lower, todos.pop()(outs))
+  # todos are recorded innermost-first by process_env_traces, so apply them
+  # in reverse order (without popping from the caller's list)
+  for todo in reversed(todos):
+    outs = [x.full_lower() if isinstance(x, Tracer) else x for x in todo(outs)]
   return outs
 
 @lu.transformation_with_aux
@@ -561,8 +816,15 @@ def process_env_traces(primitive, level, params_tuple, *args):
 
 def call_bind(primitive, f, *args, **params):
   top_trace = find_top_trace(args)
-  level = trace_state.trace_stack.next_level(True) if top_trace is None else top_trace.level
-  params_tuple = tuple(params.items())
+  stack = trace_state.trace_stack
+  if top_trace is None and not (stack.num_upward or stack.num_downward):
+    # With no traces active, no tracer can escape through f's closure, so
+    # there are no env traces for process_env_traces to post-process.
+    with new_sublevel():
+      return primitive.impl(f, *args, **params)
+
+  level = stack.next_level(True) if top_trace is None else top_trace.level
+  params_tuple = tuple(sorted(params.items()))
   f, env_trace_todo = process_env_traces(f, primitive, level, params_tuple)
   if top_trace is None:
     with new_sublevel():
@@ -586,34 +848,36 @@ call_p.def_impl(call_impl)
 # ------------------- Jaxpr printed representation -------------------
 
 def check_jaxpr(jaxpr):
+  """Checks that every variable in `jaxpr` is bound once before it is read.
+
+  This walks the whole jaxpr and its subjaxprs, so callers on hot paths should
+  guard it with `skip_checks`.
+  """
   def context():
     return "\njaxpr:\n{}\n".format(jaxpr)
 
-  def read_env(env, v):
-    if v not in env and type(v) is not Literal:
-      raise Exception("Variable '{}' not defined".format(v) + context())
-
-  def write_env(env, v):
-    if v in env:
-      raise Exception("Variable {} already bound".format(v) + context())
-    env.add(v)
+  def check_defined(vs):
+    undefined = [v for v in vs if type(v) is not Literal and v not in env]
+    if undefined:
+      raise Exception("Variable '{}' not defined".format(undefined[0])
+                      + context())
 
-  env = set()
-  read = partial(read_env, env)
-  write = partial(write_env, env)
+  def define(vs):
+    for v in vs:
+      if v in env:
+        raise Exception("Variable {} already bound".format(v) + context())
+      env.add(v)
 
-  write(unitvar)
-  map(write, jaxpr.constvars)
-  map(write, jaxpr.freevars)
-  map(write, jaxpr.invars)
+  env = {unitvar}
+  define(it.chain(jaxpr.constvars, jaxpr.freevars, jaxpr.invars))
   for eqn in jaxpr.eqns:
-    map(read, eqn.invars)
+    check_defined(eqn.invars)
     for subjaxpr, constvars, freevars in eqn.bound_subjaxprs:
-      map(read, freevars)
-      map(read, constvars)
+      check_defined(freevars)
+      check_defined(constvars)
       check_jaxpr(subjaxpr)
-    map(write, eqn.outvars)
-  map(read, jaxpr.outvars)
+    define(eqn.outvars)
+  check_defined(jaxpr.outvars)
 
 
 def pp_jaxpr(jaxpr):
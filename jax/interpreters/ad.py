@@ -201,6 +201,7 @@ def get_primitive_transpose(p):
       "Reverse-mode differentiation rule for '{}' not implemented".format(p))
 
 class JVPTrace(Trace):
+  __slots__ = []
 
   def pure(self, val):
     return JVPTracer(self, val, zero)
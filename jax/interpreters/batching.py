@@ -96,6 +96,8 @@ class BatchTracer(Tracer):
       return self
 
 class BatchTrace(Trace):
+  __slots__ = []
+
   def pure(self, val):
     return BatchTracer(self, val, not_mapped)
 
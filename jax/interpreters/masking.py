@@ -196,6 +196,8 @@ class MaskTracer(Tracer):
       return self
 
 class MaskTrace(Trace):
+  __slots__ = []
+
   def pure(self, val):
     return MaskTracer(self, None, val, ShapeExpr(*onp.shape(val)))
 
@@ -288,6 +290,8 @@ class ShapeCheckTracer(Tracer):
     return self
 
 class ShapeCheckTrace(Trace):
+  __slots__ = []
+
   def pure(self, val):
     return ShapeCheckTracer(self, Shape(*onp.shape(val)), onp.result_type(val))
 
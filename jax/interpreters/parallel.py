@@ -100,6 +100,8 @@ class PapplyTracer(Tracer):
       return self
 
 class PapplyTrace(Trace):
+  __slots__ = []
+
   def pure(self, val):
     return PapplyTracer(self, None, None, val, not_sharded)
 
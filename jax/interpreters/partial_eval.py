@@ -44,6 +44,8 @@ def identity(x): return x
 
 
 class JaxprTrace(Trace):
+  __slots__ = []
+
   def pure(self, val):
     if type(val) in core.literalable_types and onp.shape(val) == ():
       return JaxprTracer(self, PartialVal((None, val)), Literal(val))
@@ -351,8 +353,8 @@ def eqn_tracer_to_var(var, eqn):
   _, in_tracers, out_tracers, primitive, bound_subjaxprs, params = eqn
   invars  = map(var, in_tracers)
   outvars = map(var, out_tracers)
-  new_bound_subjaxprs = [(j, map(var, c), map(var, f))
-                         for j, c, f in bound_subjaxprs]
+  new_bound_subjaxprs = tuple((j, tuple(map(var, c)), tuple(map(var, f)))
+                              for j, c, f in bound_subjaxprs)
   return new_jaxpr_eqn(invars, outvars, primitive, new_bound_subjaxprs, params)
 
 
@@ -392,8 +394,7 @@ def tracers_to_jaxpr(in_tracers, out_tracers):
   env_vars, env_vals = unzip2(env.items())
   const_vars, const_vals = unzip2(consts.items())
   jaxpr = Jaxpr(const_vars, env_vars, invars, list(map(var, out_tracers)), eqns)
-  # core.skip_checks or core.check_jaxpr(jaxpr)
-  core.check_jaxpr(jaxpr)
+  core.skip_checks or core.check_jaxpr(jaxpr)
   return jaxpr, const_vals, env_vals
 
 
@@ -402,6 +403,8 @@ def gensym(suffix):
   return lambda: Var(next(counter), suffix)
 
 class Var(object):
+  __slots__ = ['count', 'suffix']
+
   def __init__(self, count, suffix):
     self.count = count
     self.suffix = suffix
@@ -451,7 +454,9 @@ def partial_eval_jaxpr(jaxpr, unknowns, instantiate):
   # jaxpr_2 :: res | a2 -> b2
   # jaxpr_2 :: [a2, res] -> b2
   jaxpr_2 = closure_convert_jaxpr(jaxpr_2)
-  jaxpr_2.invars = jaxpr_2.invars[num_res:] + jaxpr_2.invars[:num_res]
+  jaxpr_2 = Jaxpr(jaxpr_2.constvars, jaxpr_2.freevars,
+                  jaxpr_2.invars[num_res:] + jaxpr_2.invars[:num_res],
+                  jaxpr_2.outvars, jaxpr_2.eqns)
   uk_out = [pv is not None for pv in out_pvs_2]
 
   in_avals_1, in_avals_2 = unzip2(map(_split_aval, unknowns, jaxpr.in_avals))
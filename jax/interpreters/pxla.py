@@ -440,7 +440,9 @@ def parallel_callable(fun, backend, axis_name, axis_size, devices, *avals):
   with core.new_master(JaxprTrace, True) as master:
     jaxpr, (out_pvals, consts, env) = \
         trace_to_subjaxpr(dynamic_fun, master, False).call_wrapped([pval] + pvals)
-    jaxpr.invars = jaxpr.invars[1:]  # ignore dummy
+    jaxpr = core.Jaxpr(jaxpr.constvars, jaxpr.freevars,
+                       jaxpr.invars[1:],  # ignore dummy
+                       jaxpr.outvars, jaxpr.eqns)
     assert not env
     del master
   out_pvs, out_consts = unzip2(out_pvals)
@@ -613,6 +615,8 @@ class SplitAxisTracer(core.Tracer):
       return self
 
 class SplitAxisTrace(core.Trace):
+  __slots__ = []
+
   def pure(self, val):
     return SplitAxisTracer(self, not_mapped, val)
 
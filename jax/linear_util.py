@@ -156,6 +156,7 @@ class WrappedFun(object):
 
   def call_wrapped(self, *args, **kwargs):
     stack = []
+    gen = None  # bound even when there are no transforms, for the del below
     for (gen, gen_args), out_store in zip(self.transforms, self.stores):
       gen = gen(*(gen_args + tuple(args)), **kwargs)
       args, kwargs = next(gen)
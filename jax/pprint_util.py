@@ -59,7 +59,8 @@ def vcat(ps):
   if not ps:
     return pp('')
   else:
-    return reduce(lambda x, y: x + y, ps)
+    # build the line list in one pass; reducing with `+` copies it per element
+    return PrettyPrint([line for p in ps for line in p.lines])
 
 
 def pp_kv_pairs(kv_pairs):
@@ -25,6 +25,7 @@ from __future__ import division
 from __future__ import print_function
 
 from functools import partial
+import os
 
 import numpy as onp
 
@@ -33,9 +34,19 @@ from . import numpy as np
 from . import tree_util
 from .api import custom_transforms, defjvp, jit, vmap
 from .numpy.lax_numpy import _constant_like, asarray, stack
+from .util import cache
 from jax.lib import xla_bridge
 from jax import core
 from jax.scipy.special import logit
+from .config import flags
+
+FLAGS = flags.FLAGS
+flags.DEFINE_enum(
+    'jax_prng', os.getenv('JAX_PRNG', 'threefry'),
+    enum_values=['threefry', 'philox'],
+    help='Counter-based hash used to generate random bits: "threefry" or '
+    '"philox". Keys are always split and folded with Threefry. Must be set '
+    'before any random values are generated.')
 
 
 def PRNGKey(seed):
@@ -76,12 +87,14 @@ def _make_rotate_left(dtype):
     raise TypeError("_rotate_left only accepts integer dtypes.")
   nbits = onp.array(onp.iinfo(dtype).bits, dtype)
 
+  # the rotation amount `d` must already have the same dtype as `x`
   def _rotate_left(x, d):
-    if lax.dtype(d) != lax.dtype(x):
-      d = lax.convert_element_type(d, x.dtype)
     return lax.shift_left(x, d) | lax.shift_right_logical(x, nbits - d)
   return _rotate_left
 
+_rotate_left_fns = {onp.dtype(dtype): _make_rotate_left(dtype)
+                    for dtype in [onp.uint32, onp.uint64]}
+
 
 def _bit_stats(bits):
   """This is a debugging function to compute the statistics of bit fields."""
@@ -102,81 +115,161 @@ def threefry_2x32(keypair, count):
   Returns:
     An array of dtype uint32 with the same shape as `count`.
   """
-  # Based on ThreeFry2x32 by phawkins@ in //.../xla/client/lib/prng.cc
   key1, key2 = keypair
   if not lax.dtype(key1) == lax.dtype(key2) == lax.dtype(count) == onp.uint32:
     msg = "threefry_2x32 requires uint32 arguments, got {}"
     raise TypeError(msg.format([lax.dtype(x) for x in [key1, key2, count]]))
 
-  rotate_left = _make_rotate_left(lax.dtype(count))
-
-  def apply_round(v, rot):
-    v = v[:]
-    v[0] = v[0] + v[1]
-    v[1] = rotate_left(v[1], rot)
-    v[1] = v[0] ^ v[1]
-    return v
-
+  # Split the counts into two halves, padding only the (shorter) second half
+  # with a zero count when the size is odd rather than copying the whole array.
   odd_size = count.size % 2
+  half = (count.size + 1) // 2
+  flat = lax.reshape(count, (count.size,))
+  x = [lax.slice(flat, (0,), (half,)), lax.slice(flat, (half,), (count.size,))]
   if odd_size:
-    x = list(np.split(np.concatenate([count.ravel(), onp.uint32([0])]), 2))
-  else:
-    x = list(np.split(count.ravel(), 2))
+    x[1] = lax.pad(x[1], onp.uint32(0), [(0, 1, 0)])
+
+  out = np.concatenate(_threefry_2x32_rounds(key1, key2, x))
+  assert out.dtype == onp.uint32
+  return lax.reshape(out[:-1] if odd_size else out, count.shape)
+
+
+@partial(jit, static_argnums=(1,))
+def _threefry_2x32_indexed(keypair, size):
+  """Apply the Threefry 2x32 hash to the counts ``0, 1, ..., size - 1``.
+
+  Equivalent to ``threefry_2x32(keypair, lax.iota(onp.uint32, size))``, except
+  that the counts are generated inline from a half-length iota rather than
+  passed in, so that no counter array the size of the output is materialized.
+  """
+  out = np.concatenate(_threefry_2x32_indexed_lanes(keypair, size))
+  return out[:-1] if size % 2 else out
+
+@partial(jit, static_argnums=(1,))
+def _threefry_2x32_indexed_64(keypair, size):
+  """Hash the counts ``0, 1, ..., 2 * size - 1`` into `size` uint64 values.
+
+  Equivalent to combining the two halves of ``_threefry_2x32_indexed(keypair,
+  2 * size)`` as the high and low words, but uses the two output lanes of the
+  hash directly instead of concatenating and splitting them again.
+  """
+  hi, lo = [lax.convert_element_type(x, onp.uint64)
+            for x in _threefry_2x32_indexed_lanes(keypair, 2 * size)]
+  return lax.shift_left(hi, onp.uint64(32)) | lo
+
+def _threefry_2x32_indexed_lanes(keypair, size):
+  key1, key2 = keypair
+  return _threefry_2x32_rounds(key1, key2, _indexed_counts(keypair, size, 2))
+
+def _indexed_counts(keypair, size, num_lanes):
+  """Split the counts ``0, ..., size - 1`` into `num_lanes` equal lanes.
+
+  The counts are generated inline from a single iota of the lane length, and
+  the last lanes are padded out with zero counts as needed.
+  """
+  lane_size = -(-size // num_lanes)
+  counts = lax.tie_in(keypair, _iota_counts(lane_size))
+  lanes = []
+  for i in range(num_lanes):
+    lane = lax.add(counts, onp.uint32(i * lane_size)) if i else counts
+    num_valid = max(size - i * lane_size, 0)
+    if num_valid < lane_size:
+      lane = lax.select(lax.lt(counts, onp.uint32(num_valid)), lane,
+                        lax.full_like(counts, 0))
+    lanes.append(lane)
+  return lanes
+
+
+@cache(max_size=128)
+def _iota_counts(size):
+  # The iota is a lazy device constant that lowers to an XLA Iota op, so
+  # caching it per size is cheap and saves rebuilding it on every trace.
+  return lax.iota(onp.uint32, size)
+
+
+def _threefry_2x32_rounds(key1, key2, x):
+  # Based on ThreeFry2x32 by phawkins@ in //.../xla/client/lib/prng.cc
+  rotate_left = _rotate_left_fns[onp.dtype(lax.dtype(x[0]))]
 
   rotations = [onp.array([13, 15, 26, 6], dtype=onp.uint32),
                onp.array([17, 29, 16, 24], dtype=onp.uint32)]
   ks = [key1, key2, key1 ^ key2 ^ onp.uint32(0x1BD11BDA)]
 
-  # TODO(mattjj): see https://github.com/google/jax/issues/1267, as a hopefully
-  # temporary workaround for the facts that (1) XLA:CPU compile time is too slow
-  # with unrolled loops and (2) XLA:GPU execution time is too slow with rolled
-  # loops, we switch on whether the default backend is CPU or GPU. If this kind
-  # of switch ends up sticking around, we should take into account #1211 and put
-  # the switch in the translation rule rather than here in the traceable.
-  use_rolled_loops = xla_bridge.get_backend().platform == "cpu"
-
+  # The five groups of four rounds are unrolled at trace time, with the key
+  # schedule chosen statically, so XLA sees straight-line code rather than a
+  # While loop it cannot fuse across.
+  x = list(x)
   x[0] = x[0] + ks[0]
   x[1] = x[1] + ks[1]
+  for i in range(5):
+    for r in rotations[i % 2]:
+      x[0] = x[0] + x[1]
+      x[1] = x[0] ^ rotate_left(x[1], r)
+    x[0] = x[0] + ks[(i + 1) % 3]
+    x[1] = x[1] + ks[(i + 2) % 3] + onp.uint32(i + 1)
 
-  if use_rolled_loops:
-    def rotate_list(xs): return xs[1:] + xs[:1]
-    def step(i, state):
-      x, ks, rotations = state
-      for r in rotations[0]:
-        x = apply_round(x, r)
-      new_x = [x[0] + ks[0], x[1] + ks[1] + asarray(i + 1, dtype=onp.uint32)]
-      return new_x, rotate_list(ks), rotate_list(rotations)
-    x, _, _ = lax.fori_loop(0, 5, step, (x, rotate_list(ks), rotations))
+  return x
 
-  else:
-    for r in rotations[0]:
-      x = apply_round(x, r)
-    x[0] = x[0] + ks[1]
-    x[1] = x[1] + ks[2] + onp.uint32(1)
-
-    for r in rotations[1]:
-      x = apply_round(x, r)
-    x[0] = x[0] + ks[2]
-    x[1] = x[1] + ks[0] + onp.uint32(2)
-
-    for r in rotations[0]:
-      x = apply_round(x, r)
-    x[0] = x[0] + ks[0]
-    x[1] = x[1] + ks[1] + onp.uint32(3)
-
-    for r in rotations[1]:
-      x = apply_round(x, r)
-    x[0] = x[0] + ks[1]
-    x[1] = x[1] + ks[2] + onp.uint32(4)
-
-    for r in rotations[0]:
-      x = apply_round(x, r)
-    x[0] = x[0] + ks[2]
-    x[1] = x[1] + ks[0] + onp.uint32(5)
-
-  out = np.concatenate(x)
+
+@jit
+def philox_4x32(keypair, count):
+  """Apply the Philox 4x32 hash with 10 rounds.
+
+  Args:
+    keypair: a pair of 32bit unsigned integers used for the key.
+    count: an array of dtype uint32 used for the counts.
+
+  Returns:
+    An array of dtype uint32 with the same shape as `count`.
+  """
+  key1, key2 = keypair
+  if not lax.dtype(key1) == lax.dtype(key2) == lax.dtype(count) == onp.uint32:
+    msg = "philox_4x32 requires uint32 arguments, got {}"
+    raise TypeError(msg.format([lax.dtype(x) for x in [key1, key2, count]]))
+
+  lane_size = -(-count.size // 4)
+  pad = 4 * lane_size - count.size
+  flat = lax.reshape(count, (count.size,))
+  if pad:
+    flat = lax.pad(flat, onp.uint32(0), [(0, pad, 0)])
+  x = [lax.slice(flat, (i * lane_size,), ((i + 1) * lane_size,))
+       for i in range(4)]
+
+  out = np.concatenate(_philox_4x32_rounds(key1, key2, x))
   assert out.dtype == onp.uint32
-  return lax.reshape(out[:-1] if odd_size else out, count.shape)
+  return lax.reshape(out[:count.size] if pad else out, count.shape)
+
+
+@partial(jit, static_argnums=(1,))
+def _philox_4x32_indexed(keypair, size):
+  """Like `_threefry_2x32_indexed`, but using the Philox 4x32 hash."""
+  key1, key2 = keypair
+  x = _indexed_counts(keypair, size, 4)
+  out = np.concatenate(_philox_4x32_rounds(key1, key2, x))
+  return lax.slice(out, (0,), (size,))
+
+@partial(jit, static_argnums=(1,))
+def _philox_4x32_indexed_64(keypair, size):
+  """Like `_threefry_2x32_indexed_64`, but using the Philox 4x32 hash."""
+  bits = _philox_4x32_indexed(keypair, 2 * size)
+  hi, lo = [lax.convert_element_type(x, onp.uint64) for x in np.split(bits, 2)]
+  return lax.shift_left(hi, onp.uint64(32)) | lo
+
+
+def _philox_4x32_rounds(key1, key2, x):
+  # Based on Philox4x32-10 from Random123 (Salmon et al. 2011)
+  multipliers = [onp.uint32(0xD2511F53), onp.uint32(0xCD9E8D57)]
+  key_increments = [onp.uint32(0x9E3779B9), onp.uint32(0xBB67AE85)]
+  ks = [key1, key2]
+
+  x = list(x)
+  for _ in range(10):
+    hi0, lo0 = _mul_hi(x[0], multipliers[0]), lax.mul(x[0], multipliers[0])
+    hi1, lo1 = _mul_hi(x[2], multipliers[1]), lax.mul(x[2], multipliers[1])
+    x = [hi1 ^ x[1] ^ ks[0], lo1, hi0 ^ x[3] ^ ks[1], lo0]
+    ks = [ks[0] + key_increments[0], ks[1] + key_increments[1]]
+
+  return x
 
 
 def split(key, num=2):
@@ -194,8 +287,15 @@ def split(key, num=2):
 
 @partial(jit, static_argnums=(1,))
 def _split(key, num):
-  counts = lax.tie_in(key, lax.iota(onp.uint32, num * 2))
-  return lax.reshape(threefry_2x32(key, counts), (num, 2))
+  if num <= 4:
+    # Splitting into a few keys is by far the most common case. Its counts are
+    # tiny, so hash them directly as constants rather than building them from
+    # an iota tied to the key.
+    key1, key2 = key
+    counts = onp.arange(num * 2, dtype=onp.uint32).reshape(2, num)
+    x = _threefry_2x32_rounds(key1, key2, list(counts))
+    return lax.reshape(np.concatenate(x), (num, 2))
+  return lax.reshape(_threefry_2x32_indexed(key, num * 2), (num, 2))
 
 
 def fold_in(key, data):
@@ -228,11 +328,14 @@ def _random_bits(key, bit_width, shape):
     # TODO(mattjj): just split the key here
     raise TypeError("requesting more random bits than a single call provides.")
 
-  counts = lax.tie_in(key, lax.iota(onp.uint32, max_count))
-  bits = threefry_2x32(key, counts)
+  if FLAGS.jax_prng == "philox":
+    hash_fun, hash_fun_64 = _philox_4x32_indexed, _philox_4x32_indexed_64
+  else:
+    hash_fun, hash_fun_64 = _threefry_2x32_indexed, _threefry_2x32_indexed_64
   if bit_width == 64:
-    bits = [lax.convert_element_type(x, onp.uint64) for x in np.split(bits, 2)]
-    bits = lax.shift_left(bits[0], onp.uint64(32)) | bits[1]
+    bits = hash_fun_64(key, int(max_count) // 2)
+  else:
+    bits = hash_fun(key, int(max_count))
   return lax.reshape(bits, shape)
 
 
@@ -247,6 +350,22 @@ def _check_shape(name, shape):
     raise ValueError(msg.format(name, shape))
 
 
+def _promote_rank(x, shape):
+  """Reshapes `x` to the rank of `shape` without broadcasting its values.
+
+  lax's elementwise ops broadcast unit dimensions of operands of equal rank, so
+  a parameter promoted this way is broadcast inside the consuming op instead of
+  being materialized at the full sample shape first.
+  """
+  x_shape = onp.shape(x)
+  if lax.broadcast_shapes(shape, x_shape) != tuple(shape):
+    msg = "Parameter of shape {} is not broadcastable to the sample shape {}."
+    raise ValueError(msg.format(x_shape, shape))
+  if not x_shape or len(x_shape) == len(shape):
+    return x
+  return lax.reshape(x, (1,) * (len(shape) - len(x_shape)) + x_shape)
+
+
 def uniform(key, shape=(), dtype=onp.float64, minval=0., maxval=1.):
   """Sample uniform random values in [minval, maxval) with given shape/dtype.
 
@@ -262,35 +381,41 @@ def uniform(key, shape=(), dtype=onp.float64, minval=0., maxval=1.):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
-  return _uniform(key, shape, dtype, minval, maxval)
-
-@partial(jit, static_argnums=(1, 2))
-def _uniform(key, shape, dtype, minval, maxval):
   _check_shape("uniform", shape)
   if not onp.issubdtype(dtype, onp.floating):
     raise TypeError("uniform only accepts floating point dtypes.")
+  if onp.finfo(dtype).bits not in (32, 64):
+    raise TypeError("uniform only accepts 32- or 64-bit dtypes.")
+  return _uniform(key, shape, dtype, minval, maxval)
 
+@partial(jit, static_argnums=(1, 2))
+def _uniform(key, shape, dtype, minval, maxval):
   minval = lax.convert_element_type(minval, dtype)
   maxval = lax.convert_element_type(maxval, dtype)
+  nbits = onp.finfo(dtype).bits
+  floats = _floats_from_bits(_random_bits(key, nbits, shape), dtype)
+  return lax.reshape(floats * (maxval - minval) + minval, shape)
+
+
+def _floats_from_bits(bits, dtype):
+  """Map random bits to floats of the given dtype, uniform in [0, 1)."""
+  # The strategy here is to keep the top nmant + 1 random bits, which convert to
+  # floating point exactly, and scale them by 2**-(nmant + 1) to land in [0, 1).
+  # Converting all nbits instead could round up to 1. Since the floats are
+  # strictly below 1, uniform's result already lies in [minval, maxval).
+  shift, scale = _floats_from_bits_consts[onp.dtype(dtype)]
+  return lax.mul(lax.convert_element_type(lax.shift_right_logical(bits, shift),
+                                          dtype),
+                 scale)
+
+def _make_floats_from_bits_consts(dtype):
   finfo = onp.finfo(dtype)
-  nbits, nmant = finfo.bits, finfo.nmant
+  uint_dtype = onp.uint32 if finfo.bits == 32 else onp.uint64
+  return (onp.array(finfo.bits - finfo.nmant - 1, uint_dtype),
+          onp.array(2. ** -(finfo.nmant + 1), dtype))
 
-  if nbits not in (32, 64):
-    raise TypeError("uniform only accepts 32- or 64-bit dtypes.")
-
-  bits = _random_bits(key, nbits, shape)
-
-  # The strategy here is to randomize only the mantissa bits with an exponent of
-  # 1 (after applying the bias), then shift and scale to the desired range. The
-  # bit-level transformation we use relies on Numpy and XLA having bit-for-bit
-  # equivalent float representations, which might not be true on all platforms.
-  float_bits = lax.bitwise_or(
-      lax.shift_right_logical(bits, onp.array(nbits - nmant, lax.dtype(bits))),
-      onp.array(1., dtype).view(onp.uint32 if nbits == 32 else onp.uint64))
-  floats = lax.bitcast_convert_type(float_bits, dtype) - onp.array(1., dtype)
-  return lax.max(
-      minval,
-      lax.reshape(floats * (maxval - minval) + minval, shape))
+_floats_from_bits_consts = {onp.dtype(dtype): _make_floats_from_bits_consts(dtype)
+                            for dtype in [onp.float32, onp.float64]}
 
 
 def randint(key, shape, minval, maxval, dtype=onp.int64):
@@ -310,49 +435,60 @@ def randint(key, shape, minval, maxval, dtype=onp.int64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
-  return _randint(key, shape, minval, maxval, dtype)
-
-@partial(jit, static_argnums=(1, 4))
-def _randint(key, shape, minval, maxval, dtype):
   _check_shape("randint", shape)
   if not onp.issubdtype(dtype, onp.integer):
     raise TypeError("randint only accepts integer dtypes.")
+  if onp.iinfo(dtype).bits not in (32, 64):
+    raise TypeError("randint only accepts 32- or 64-bit dtypes.")
+  return _randint(key, shape, minval, maxval, dtype)
 
+@partial(jit, static_argnums=(1, 4))
+def _randint(key, shape, minval, maxval, dtype):
   minval = lax.convert_element_type(minval, dtype)
   maxval = lax.convert_element_type(maxval, dtype)
   nbits = onp.iinfo(dtype).bits
 
-  if nbits not in (32, 64):
-    raise TypeError("randint only accepts 32- or 64-bit dtypes.")
-
   # if we don't have minval < maxval, just always return minval
   # https://github.com/google/jax/issues/222
   maxval = lax.max(lax.add(minval, onp.array(1, dtype)), maxval)
 
-  # This algorithm is biased whenever (maxval - minval) is not a power of 2.
-  # We generate double the number of random bits required by the dtype so as to
-  # reduce that bias.
-  k1, k2 = split(key)
-  rbits = lambda key: _random_bits(key, nbits, shape)
-  higher_bits, lower_bits = rbits(k1), rbits(k2)
+  # We treat 2 * nbits random bits as a fraction r in [0, 1) and return
+  # floor(r * span), computed with multiplications rather than the integer
+  # divisions a remainder would need. This is biased whenever (maxval - minval)
+  # is not a power of 2, but using twice the number of random bits required by
+  # the dtype keeps that bias below span / 2**(2 * nbits).
+  bits = _random_bits(key, nbits, (2,) + tuple(shape))
+  higher_bits, lower_bits = bits[0], bits[1]
 
   unsigned_dtype = onp.uint32 if nbits == 32 else onp.uint64
   span = lax.convert_element_type(maxval - minval, unsigned_dtype)
 
-  # To compute a remainder operation on an integer that might have twice as many
-  # bits as we can represent in the native unsigned dtype, we compute a
-  # multiplier equal to 2**nbits % span (using that nbits is 32 or 64).
-  multiplier = lax.rem(onp.array(2**16, unsigned_dtype), span)
-  multiplier = lax.rem(lax.mul(multiplier, multiplier), span)
-  if nbits == 64:
-    multiplier = lax.rem(lax.mul(multiplier, multiplier), span)
-
-  random_offset = lax.add(lax.mul(lax.rem(higher_bits, span), multiplier),
-                          lax.rem(lower_bits, span))
-  random_offset = lax.rem(random_offset, span)
+  # floor(r * span) is the high word of higher_bits * span, plus the carry out
+  # of adding its low word to the high word of lower_bits * span.
+  product_lo = lax.mul(higher_bits, span)
+  sum_lo = lax.add(product_lo, _mul_hi(lower_bits, span))
+  carry = lax.convert_element_type(lax.lt(sum_lo, product_lo), unsigned_dtype)
+  random_offset = lax.add(_mul_hi(higher_bits, span), carry)
   return lax.add(minval, lax.convert_element_type(random_offset, dtype))
 
 
+def _mul_hi(x, y):
+  """Return the high word of the double-width product of unsigned x and y."""
+  dtype = lax.dtype(x)
+  half_bits = onp.iinfo(dtype).bits // 2
+  shift = onp.array(half_bits, dtype)
+  mask = onp.array((1 << half_bits) - 1, dtype)
+  x_lo, x_hi = lax.bitwise_and(x, mask), lax.shift_right_logical(x, shift)
+  y_lo, y_hi = lax.bitwise_and(y, mask), lax.shift_right_logical(y, shift)
+  lo_lo, hi_lo = lax.mul(x_lo, y_lo), lax.mul(x_hi, y_lo)
+  lo_hi, hi_hi = lax.mul(x_lo, y_hi), lax.mul(x_hi, y_hi)
+  cross = lax.add(lax.add(lax.shift_right_logical(lo_lo, shift),
+                          lax.bitwise_and(hi_lo, mask)),
+                  lo_hi)
+  return lax.add(lax.add(hi_hi, lax.shift_right_logical(hi_lo, shift)),
+                 lax.shift_right_logical(cross, shift))
+
+
 def shuffle(key, x, axis=0):
   """Shuffle the elements of an array uniformly at random along an axis.
 
@@ -382,13 +518,17 @@ def _shuffle(key, x, axis):
   # info, and for the original implementation of this algorithm. See also
   # Section 2 of http://people.csail.mit.edu/costis/6896sp11/lec5s.pdf for
   # another analysis (where the keys are generated one bit at a time).
+  # When 64-bit types are enabled we sort on 64bit keys, each equivalent to the
+  # concatenation of two successive 32bit keys, which halves the number of
+  # sorting passes over x.
   exponent = 3  # see tjablin@'s analysis for explanation of this parameter
-  uint32max = onp.iinfo(onp.uint32).max
-  num_rounds = int(onp.ceil(exponent * onp.log(x.size) / onp.log(uint32max)))
+  key_dtype = xla_bridge.canonicalize_dtype(onp.uint64)
+  key_max = onp.iinfo(key_dtype).max
+  num_rounds = int(onp.ceil(exponent * onp.log(x.size) / onp.log(key_max)))
 
   for _ in range(num_rounds):
     key, subkey = split(key)
-    sort_keys = _random_bits(subkey, 32, x.shape)
+    sort_keys = _random_bits(subkey, onp.iinfo(key_dtype).bits, x.shape)
     _, x = lax.sort_key_val(sort_keys, x, axis)
 
   return x
@@ -407,15 +547,32 @@ def normal(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("normal", shape)
+  if not onp.issubdtype(dtype, onp.floating):
+    raise TypeError("normal only accepts floating point dtypes.")
+  if onp.finfo(dtype).bits not in (32, 64):
+    raise TypeError("normal only accepts 32- or 64-bit dtypes.")
   return _normal(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _normal(key, shape, dtype):
-  _check_shape("normal", shape)
-  lo = onp.nextafter(onp.array(-1., dtype), 0., dtype=dtype)
-  hi = onp.array(1., dtype)
-  u = uniform(key, shape, dtype, lo, hi)
-  return onp.array(onp.sqrt(2), dtype) * lax.erf_inv(u)
+  nbits = onp.finfo(dtype).bits
+  return _normal_from_bits(_random_bits(key, nbits, shape), dtype)
+
+
+def _normal_from_bits(bits, dtype):
+  """Map random bits to standard normal values of the given dtype."""
+  # The top nmant random bits m are mapped to (2 * m + 1) / 2**nmant - 1, which
+  # is computed exactly and lies strictly inside (-1, 1), and then through the
+  # inverse error function. Going straight from bits to the open interval
+  # avoids the rescaling a call to uniform would need.
+  finfo = onp.finfo(dtype)
+  nbits, nmant = finfo.bits, finfo.nmant
+  m = lax.shift_right_logical(bits, onp.array(nbits - nmant, lax.dtype(bits)))
+  u = lax.add(lax.mul(lax.convert_element_type(m, dtype),
+                      onp.array(2. ** (1 - nmant), dtype)),
+              onp.array(2. ** -nmant - 1., dtype))
+  return lax.mul(onp.array(onp.sqrt(2), dtype), lax.erf_inv(u))
 
 
 def truncated_normal(key, lower, upper, shape=(), dtype=onp.float64):
@@ -433,11 +590,11 @@ def truncated_normal(key, lower, upper, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("truncated_normal", shape)
   return _truncated_normal(key, lower, upper, shape, dtype)
 
 @partial(jit, static_argnums=(3, 4))
 def _truncated_normal(key, lower, upper, shape, dtype):
-  _check_shape("truncated_normal", shape)
   sqrt2 = onp.array(onp.sqrt(2), dtype)
   a = lax.erf(lax.convert_element_type(lower, dtype) / sqrt2)
   b = lax.erf(lax.convert_element_type(upper, dtype) / sqrt2)
@@ -463,15 +620,28 @@ def bernoulli(key, p=onp.float32(0.5), shape=()):
     msg = "bernoulli probability `p` must have a floating dtype, got {}."
     raise TypeError(msg.format(dtype))
   p = lax.convert_element_type(p, dtype)
+  _check_shape("bernoulli", shape)
   return _bernoulli(key, p, shape)
 
 @partial(jit, static_argnums=(2,))
 def _bernoulli(key, p, shape):
-  _check_shape("bernoulli", shape)
   shape = shape or onp.shape(p)
   if onp.shape(p) != shape:
     p = np.broadcast_to(p, shape)
-  return lax.lt(uniform(key, shape, lax.dtype(p)), p)
+
+  # Rather than materializing uniform floats, compare raw 32-bit draws against
+  # p scaled to [0, 2**32). Since 2**32 doesn't fit in a uint32, p is clamped to
+  # just below 1 for the comparison and p >= 1 is handled separately.
+  if onp.dtype(lax.dtype(p)).itemsize < 4:
+    p = lax.convert_element_type(p, onp.float32)
+  dtype = lax.dtype(p)
+  below_one = onp.nextafter(onp.array(1., dtype), onp.array(0., dtype))
+  scaled_p = lax.mul(lax.clamp(_constant_like(p, 0), p,
+                               _constant_like(p, below_one)),
+                     _constant_like(p, 2. ** 32))
+  threshold = lax.convert_element_type(scaled_p, onp.uint32)
+  bits = _random_bits(key, 32, shape)
+  return lax.bitwise_or(lax.lt(bits, threshold), lax.ge(p, _constant_like(p, 1)))
 
 
 def beta(key, a, b, shape=(), dtype=onp.float64):
@@ -492,17 +662,17 @@ def beta(key, a, b, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("beta", shape)
   return _beta(key, a, b, shape, dtype)
 
 @partial(jit, static_argnums=(3, 4))
 def _beta(key, a, b, shape, dtype):
-  _check_shape("beta", shape)
   a = lax.convert_element_type(a, dtype)
   b = lax.convert_element_type(b, dtype)
   shape = shape or lax.broadcast_shapes(np.shape(a), np.shape(b))
-  key_a, key_b = split(key)
-  gamma_a = gamma(key_a, a, shape, dtype)
-  gamma_b = gamma(key_b, b, shape, dtype)
+  # sample both gamma variates with a single call, stacked along a leading axis
+  ab = stack([np.broadcast_to(a, shape), np.broadcast_to(b, shape)])
+  gamma_a, gamma_b = _gamma_impl(key, ab)
   return gamma_a / (gamma_a + gamma_b)
 
 
@@ -520,11 +690,11 @@ def cauchy(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("cauchy", shape)
   return _cauchy(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _cauchy(key, shape, dtype):
-  _check_shape("cauchy", shape)
   u = uniform(key, shape, dtype, minval=onp.finfo(dtype).eps, maxval=1.)
   pi = _constant_like(u, onp.pi)
   return lax.tan(lax.mul(pi, lax.sub(u, _constant_like(u, 0.5))))
@@ -546,14 +716,17 @@ def dirichlet(key, alpha, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("dirichlet", shape)
   return _dirichlet(key, alpha, shape, dtype)
 
 @partial(jit, static_argnums=(2, 3))
 def _dirichlet(key, alpha, shape, dtype):
-  _check_shape("dirichlet", shape)
   alpha = asarray(alpha, dtype)
   shape = shape or alpha.shape[:-1]
-  gamma_samples = gamma(key, alpha, shape + alpha.shape[-1:], dtype)
+  # Sample through _gamma_impl directly rather than the jitted gamma wrapper,
+  # so that sampling and normalization are traced into one computation.
+  alpha = np.broadcast_to(alpha, shape + alpha.shape[-1:])
+  gamma_samples = _gamma_impl(key, alpha)
   return gamma_samples / np.sum(gamma_samples, axis=-1, keepdims=True)
 
 
@@ -571,89 +744,113 @@ def exponential(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("exponential", shape)
   return _exponential(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _exponential(key, shape, dtype):
-  _check_shape("exponential", shape)
   u = uniform(key, shape, dtype)
   # taking 1 - u to move the domain of log to (0, 1] instead of [0, 1)
   return lax.neg(lax.log1p(lax.neg(u)))
 
 
-def _gamma_one(key, alpha):
+def _gamma_batch(key, alpha, oversample=2):
   # Ref: A simple method for generating gamma variables, George Marsaglia and Wai Wan Tsang
   # The algorithm can also be founded in:
   # https://en.wikipedia.org/wiki/Gamma_distribution#Generating_gamma-distributed_random_variables
+  # Rejection sampling is done for the whole array at once rather than under
+  # vmap: every iteration draws `oversample` proposals for each element, and an
+  # element keeps its first accepted proposal, so that far fewer iterations are
+  # needed before all elements have accepted.
   zero = _constant_like(alpha, 0)
   one = _constant_like(alpha, 1)
-  minus_one = _constant_like(alpha, -1)
   one_over_two = _constant_like(alpha, 0.5)
   one_over_three = _constant_like(alpha, 1. / 3.)
-  squeeze_const = _constant_like(alpha, 0.0331)
   dtype = lax.dtype(alpha)
+  shape = onp.shape(alpha)
+
+  nbits = onp.finfo(dtype).bits
 
   key, subkey = split(key)
+  # The uniforms for the boost and the first round of proposals come from a
+  # single draw of random bits, so that in the common case where every element
+  # accepts on the first round the hash is only evaluated once.
+  bits = _random_bits(subkey, nbits, (1 + 2 * oversample,) + shape)
+
   # for alpha < 1, we boost alpha to alpha + 1 and get a sample according to
   # Gamma(alpha) ~ Gamma(alpha+1) * Uniform()^(1 / alpha)
-  boost = lax.select(lax.ge(alpha, one),
-                     one,
-                     lax.pow(uniform(subkey, (), dtype=dtype), lax.div(one, alpha)))
-  alpha = lax.select(lax.ge(alpha, one), alpha, lax.add(alpha, one))
+  boost = np.where(lax.ge(alpha, one),
+                   one,
+                   lax.pow(_floats_from_bits(bits[0], dtype), lax.div(one, alpha)))
+  alpha = np.where(lax.ge(alpha, one), alpha, lax.add(alpha, one))
 
   d = lax.sub(alpha, one_over_three)
   c = lax.div(one_over_three, lax.pow(d, one_over_two))
-
-  def _cond_fn(kXVU):
-    _, X, V, U = kXVU
-    # TODO: use lax.cond when its batching rule is supported
-    # The reason is to avoid evaluating second condition which involves log+log
-    # if the first condition is satisfied
-    cond = lax.bitwise_and(lax.ge(U, lax.sub(one, lax.mul(squeeze_const, lax.mul(X, X)))),
-                           lax.ge(lax.log(U), lax.add(lax.mul(X, one_over_two),
-                                                      lax.mul(d, lax.add(lax.sub(one, V),
-                                                                         lax.log(V))))))
-    return cond
-
-  def _body_fn(kXVU):
-    def _next_kxv(kxv):
-      key = kxv[0]
-      key, subkey = split(key)
-      x = normal(subkey, (), dtype=dtype)
-      v = lax.add(one, lax.mul(x, c))
-      return key, x, v
-
-    key = kXVU[0]
-    key, x_key, U_key = split(key, 3)
-    _, x, v = lax.while_loop(lambda kxv: lax.le(kxv[2], zero), _next_kxv, (x_key, zero, minus_one))
-    X = lax.mul(x, x)
-    V = lax.mul(lax.mul(v, v), v)
-    U = uniform(U_key, (), dtype=dtype)
-    return key, X, V, U
-
-  # initial state is chosen such that _cond_fn will return True
-  _, _, V, _ = lax.while_loop(_cond_fn, _body_fn, (key, zero, one, _constant_like(alpha, 2)))
+  # d and c are broadcast against the leading oversample axis of the proposals
+  proposal_shape = (oversample,) + shape
+  d_proposal = _promote_rank(d, proposal_shape)
+  c_proposal = _promote_rank(c, proposal_shape)
+
+  def _propose(bits, accepted, V):
+    # The normal and uniform proposals are mapped from the bits the same way as
+    # `normal` and `uniform` map them.
+    x = _normal_from_bits(bits[0], dtype)
+    U = _floats_from_bits(bits[1], dtype)
+    X = x * x
+    v = one + x * c_proposal
+    V_proposed = v * v * v
+    # proposals with v <= 0 are rejected, and kept away from the log. The
+    # squeeze test U < 1 - 0.0331 * x**4 is not used: it only accepts points
+    # the log test accepts too, and with the whole batch evaluated at once it
+    # cannot save computing the logs.
+    log_V = np.log(np.where(v > zero, V_proposed, one))
+    log_accept = X * one_over_two + d_proposal * (one - V_proposed + log_V)
+    accept = (v > zero) & (np.log(U) < log_accept)
+
+    new_V = V
+    for i in reversed(range(oversample)):
+      new_V = np.where(accept[i], V_proposed[i], new_V)
+    V = np.where(accepted, V, new_V)
+    return accepted | np.any(accept, axis=0), V
+
+  def _cond_fn(state):
+    _, accepted, _ = state
+    return np.any(~accepted)
+
+  def _body_fn(state):
+    key, accepted, V = state
+    key, subkey = split(key)
+    bits = _random_bits(subkey, nbits, (2, oversample) + shape)
+    accepted, V = _propose(bits, accepted, V)
+    return key, accepted, V
+
+  accepted, V = _propose(
+      lax.reshape(bits[1:], (2, oversample) + shape),
+      lax.full(shape, False, onp.bool_), lax.full_like(alpha, 1))
+  _, _, V = lax.while_loop(_cond_fn, _body_fn, (key, accepted, V))
   z = lax.mul(lax.mul(d, V), boost)
-  return lax.select(lax.eq(z, zero), onp.finfo(z.dtype).tiny, z)
+  return np.where(lax.eq(z, zero), _constant_like(z, onp.finfo(dtype).tiny), z)
 
 
-_bivariate_coef = [[0.16009398, -0.094634816, 0.025146379, -0.0030648348,
+_bivariate_coef = onp.array([[0.16009398, -0.094634816, 0.025146379, -0.0030648348,
                     1, 0.3266811, 0.10406087, 0.0014179033],
                    [0.53487893, 0.12980707, 0.06573594, -0.0015649787,
                     0.16639465, 0.020070098, -0.0035938937, -0.00058392601],
                    [0.040121005, -0.0065914079, -0.002628604, -0.0013441777,
-                    0.017050642, -0.0021309345, 0.00085092385, -1.5248239e-07]]
+                    0.017050642, -0.0021309345, 0.00085092385, -1.5248239e-07]])
+
+# coefficients (-1)^i / i! of the series terms used in _gamma_grad_one's case 1
+_series_coef = onp.cumprod(onp.concatenate([[1.], -1. / onp.arange(1, 6)]))
 
 
 def _gamma_grad_one(z, alpha):
     # Ref 1: Pathwise Derivatives Beyond the Reparameterization Trick, Martin & Fritz
     # Ref 2: Case 4 follows https://github.com/fritzo/notebooks/blob/master/gamma-reparameterized.ipynb
 
-    # TODO: use lax.cond instead of lax.while_loop when its batching rule is available
-    # See https://github.com/google/jax/issues/490
-    def _case1(zagf):
-        z, alpha, _, flag = zagf
-
+    # All four cases are computed unconditionally and the right one is selected
+    # at the end, so that under vmap this is a single branchless computation
+    # rather than a cascade of batched while loops.
+    def _case1(z, alpha):
         # dz = - dCDF(z; a) / pdf(z; a)
         # pdf = z^(a-1) * e^(-z) / Gamma(a)
         # CDF(z; a) = IncompleteGamma(a, z) / Gamma(a)
@@ -665,29 +862,18 @@ def _gamma_grad_one(z, alpha):
         #                                                - z^3/3!(a+3)^2 + z^4/4!(a+4)^2 - z^5/5!(a+5)^2 ]
         #                  =: z^a * log(z) * term1 - z^a * term2
         # unnormalized_dCDF = z^a { [log(z) - Digamma(a)] * term1 - term2 }
-        zi = 1.0
-        update = zi / alpha
-        term1 = update
-        term2 = update / alpha
-        for i in range(1, 6):
-            zi = -zi * z / i
-            update = zi / (alpha + i)
-            term1 = term1 + update
-            term2 = term2 + update / (alpha + i)
+        # Both series are evaluated as length-6 vectors of terms and reduced.
+        i = _constant_like(alpha, onp.arange(6))
+        zi = _constant_like(alpha, _series_coef) * np.power(z, i)
+        alpha_i = alpha + i
+        term1 = np.sum(zi / alpha_i, axis=-1)
+        term2 = np.sum(zi / (alpha_i * alpha_i), axis=-1)
 
         unnormalized_cdf_dot = np.power(z, alpha) * ((np.log(z) - lax.digamma(alpha)) * term1 - term2)
         unnormalized_pdf = np.power(z, alpha - 1) * np.exp(-z)
-        grad = -unnormalized_cdf_dot / unnormalized_pdf
-
-        return z, alpha, grad, ~flag
-
-    def _cond2(zagf):
-        z, alpha, _, flag = zagf
-        return (~flag) & (alpha > 8.0) & ((z < 0.9 * alpha) | (z > 1.1 * alpha))
-
-    def _case2(zagf):
-        z, alpha, _, flag = zagf
+        return -unnormalized_cdf_dot / unnormalized_pdf
 
+    def _case2(z, alpha):
         # Formula 58 of [1]
         sqrt_8a = np.sqrt(8 * alpha)
         z_minus_a = z - alpha
@@ -696,49 +882,50 @@ def _gamma_grad_one(z, alpha):
         term1 = 4 * (z + alpha) / (sqrt_8a * z_minus_a * z_minus_a)
         term2 = log_z_div_a * (sqrt_8a / z_minus_a + sign * np.power(z_minus_a - alpha * log_z_div_a, -1.5))
         term3 = z * (1.0 + 1.0 / (12 * alpha) + 1.0 / (288 * alpha * alpha)) / sqrt_8a
-        grad = (term1 + term2) * term3
-
-        return z, alpha, grad, ~flag
-
-    def _cond3(zagf):
-        z, alpha, _, flag = zagf
-        return (~flag) & (alpha > 8.0) & (z >= 0.9 * alpha) & (z <= 1.1 * alpha)
-
-    def _case3(zagf):
-        z, alpha, _, flag = zagf
+        return (term1 + term2) * term3
 
+    def _case3(z, alpha):
         # Formula 59 of [1]
         z_div_a = np.divide(z, alpha)
         aa = alpha * alpha
         term1 = 1440 * alpha + 6 * z_div_a * (53 - 120 * z) - 65 * z_div_a * z_div_a + 3600 * z + 107
         term2 = 1244160 * alpha * aa
         term3 = 1 + 24 * alpha + 288 * aa
-        grad = term1 * term3 / term2
-
-        return z, alpha, grad, ~flag
-
-    def _case4(zagf):
-        z, alpha, _, flag = zagf
+        return term1 * term3 / term2
 
+    def _case4(z, alpha):
         # Ref [2]
         u = np.log(z / alpha)
         v = np.log(alpha)
-        c = []
-        for i in range(8):
-            c.append(_bivariate_coef[0][i] + u * (_bivariate_coef[1][i] + u * _bivariate_coef[2][i]))
-        p = c[0] + v * (c[1] + v * (c[2] + v * c[3]))
-        q = c[4] + v * (c[5] + v * (c[6] + v * c[7]))
-        grad = np.exp(p / np.maximum(q, 0.01))
-
-        return z, alpha, grad, ~flag
-
-    _, _, grad, flag = lax.while_loop(lambda zagf: (~zagf[3]) & (zagf[0] < 0.8),
-                                      _case1,
-                                      (z, alpha, 0.0, False))
-    _, _, grad, flag = lax.while_loop(_cond2, _case2, (z, alpha, grad, flag))
-    _, _, grad, flag = lax.while_loop(_cond3, _case3, (z, alpha, grad, flag))
-    _, _, grad, flag = lax.while_loop(lambda zagf: ~zagf[3], _case4, (z, alpha, grad, flag))
-    return grad
+        # Horner's rule in u over all eight coefficients at once, then in v for
+        # the numerator p and denominator q together.
+        coef = _constant_like(alpha, _bivariate_coef)
+        c = np.reshape(coef[0] + u * (coef[1] + u * coef[2]), (2, 4))
+        p, q = c[:, 0] + v * (c[:, 1] + v * (c[:, 2] + v * c[:, 3]))
+        return np.exp(p / np.maximum(q, 0.01))
+
+    use_case1 = z < 0.8
+    large_alpha = alpha > 8.0
+    near_alpha = (z >= 0.9 * alpha) & (z <= 1.1 * alpha)
+    use_case2 = ~use_case1 & large_alpha & ~near_alpha
+    use_case3 = ~use_case1 & large_alpha & near_alpha
+    use_case4 = ~use_case1 & ~large_alpha
+
+    # Outside its own region, each case is evaluated at a fixed point (z, alpha)
+    # inside that region instead. Besides keeping the unselected values finite,
+    # this keeps their derivatives finite, so that the zero cotangent np.where
+    # sends into an unselected case does not turn into nan.
+    def _guarded(case, use_case, safe_z, safe_alpha):
+        return case(np.where(use_case, z, safe_z),
+                    np.where(use_case, alpha, safe_alpha))
+
+    grad1 = _guarded(_case1, use_case1, 0.5, 1.0)
+    grad2 = _guarded(_case2, use_case2, 5.0, 10.0)
+    grad3 = _guarded(_case3, use_case3, 10.0, 10.0)
+    grad4 = _guarded(_case4, use_case4, 1.0, 1.0)
+    return np.where(use_case1, grad1,
+                    np.where(use_case2, grad2,
+                             np.where(use_case3, grad3, grad4)))
 
 
 def _gamma_grad(sample, a):
@@ -750,10 +937,7 @@ def _gamma_grad(sample, a):
 
 @custom_transforms
 def _gamma_impl(key, a):
-    alphas = np.reshape(a, -1)
-    keys = split(key, onp.size(alphas))
-    samples = vmap(_gamma_one)(keys, alphas)
-    return np.reshape(samples, np.shape(a))
+    return _gamma_batch(key, a)
 
 
 defjvp(_gamma_impl, None,
@@ -776,11 +960,11 @@ def gamma(key, a, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("gamma", shape)
   return _gamma(key, a, shape, dtype)
 
 @partial(jit, static_argnums=(2, 3))
 def _gamma(key, a, shape, dtype):
-  _check_shape("gamma", shape)
   a = lax.convert_element_type(a, dtype)
   shape = shape or onp.shape(a)
   if onp.shape(a) != shape:
@@ -802,11 +986,11 @@ def gumbel(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("gumbel", shape)
   return _gumbel(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _gumbel(key, shape, dtype):
-  _check_shape("gumbel", shape)
   return -np.log(-np.log(
       uniform(key, shape, dtype, minval=onp.finfo(dtype).eps, maxval=1.)))
 
@@ -825,11 +1009,11 @@ def laplace(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("laplace", shape)
   return _laplace(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _laplace(key, shape, dtype):
-  _check_shape("laplace", shape)
   u = uniform(
       key, shape, dtype, minval=-1. + np.finfo(dtype).epsneg, maxval=1.)
   return lax.mul(lax.sign(u), lax.log1p(lax.neg(lax.abs(u))))
@@ -849,11 +1033,11 @@ def logistic(key, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  _check_shape("logistic", shape)
   return _logistic(key, shape, dtype)
 
 @partial(jit, static_argnums=(1, 2))
 def _logistic(key, shape, dtype):
-  _check_shape("logistic", shape)
   return logit(uniform(key, shape, dtype))
 
 
@@ -873,17 +1057,90 @@ def pareto(key, b, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  shape = shape or onp.shape(b)
+  _check_shape("pareto", shape)
+  if onp.isscalar(b):
+    # compute the exponent of a scalar b on the host rather than in the traced
+    # computation; like the device path, b = 0 gives -inf without a warning
+    with onp.errstate(divide='ignore'):
+      exponent = -1 / onp.array(b, dtype)
+    return _pareto_from_exponent(key, exponent, shape, dtype)
   return _pareto(key, b, shape, dtype)
 
 @partial(jit, static_argnums=(2, 3))
 def _pareto(key, b, shape, dtype):
-  _check_shape("pareto", shape)
   b = lax.convert_element_type(b, dtype)
+  return _pareto_sample(key, _pareto_exponent(b), shape, dtype)
+
+@partial(jit, static_argnums=(2, 3))
+def _pareto_from_exponent(key, exponent, shape, dtype):
+  return _pareto_sample(key, exponent, shape, dtype)
+
+def _pareto_exponent(b):
+  # the reciprocal of b is taken once at the shape of b, and its negation is
+  # folded into the constant numerator
+  return lax.div(_constant_like(b, -1), b)
+
+def _pareto_sample(key, exponent, shape, dtype):
+  # exp(e / b) with e = -log(u) exponential is u ** (-1 / b); 1 - u moves the
+  # domain of the uniform to (0, 1] so the power stays finite. The exponent is
+  # computed at the shape of b and broadcast by the pow itself.
+  u = _floats_from_bits(_random_bits(key, onp.finfo(dtype).bits, shape), dtype)
+  u = lax.sub(_constant_like(u, 1), u)
+  return lax.pow(u, _promote_rank(exponent, shape))
+
+
+def pareto_batched(keys, b, shape=(), dtype=onp.float64):
+  """Sample Pareto random values for each PRNG key in a batch.
+
+  The result matches stacking `pareto(key, b, shape, dtype)` for each key in
+  `keys`. The batch is traced and dispatched as a single computation, which is
+  much cheaper than calling `pareto` in a Python loop when drawing many small
+  samples.
+
+  Args:
+    keys: an array of PRNGKeys with shape `(n, 2)`.
+    b: an array-like broadcastable to `shape` and used as the shape parameter
+      of the random variables.
+    shape: optional, a tuple of nonnegative integers representing the shape
+      drawn for each key (default scalar).
+    dtype: optional, a float dtype for the returned values (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+
+  Returns:
+    A random array with shape `(n,) + shape` and the specified dtype.
+  """
+  dtype = xla_bridge.canonicalize_dtype(dtype)
   shape = shape or onp.shape(b)
-  if onp.shape(b) != shape:
-    b = np.broadcast_to(b, shape)
-  e = exponential(key, shape, dtype)
-  return lax.exp(lax.div(e, b))
+  _check_shape("pareto_batched", shape)
+  return _pareto_batched(keys, b, shape, dtype)
+
+@partial(jit, static_argnums=(2, 3))
+def _pareto_batched(keys, b, shape, dtype):
+  b = lax.convert_element_type(b, dtype)
+  exponent = _pareto_exponent(b)
+  return vmap(lambda key: _pareto_sample(key, exponent, shape, dtype))(keys)
+
+
+def precompile_pareto(shapes, dtypes=(onp.float64,), b=1.):
+  """Traces and compiles `pareto` ahead of time for the given shapes and dtypes.
+
+  The first call of `pareto` with a new shape and dtype pays for tracing and
+  compiling a computation, which for small shapes costs much more than the
+  sampling itself. Calling this at startup with the shapes a program samples
+  moves that cost out of the first real call.
+
+  Args:
+    shapes: an iterable of sample shapes.
+    dtypes: optional, an iterable of float dtypes (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+    b: optional, a value of the same kind (Python scalar, or array of the same
+      shape and dtype) as the `b` later passed to `pareto` (default 1.).
+  """
+  key = PRNGKey(0)
+  for shape in shapes:
+    for dtype in dtypes:
+      pareto(key, b, tuple(shape), dtype)
 
 
 def t(key, df, shape=(), dtype=onp.float64):
@@ -902,16 +1159,84 @@ def t(key, df, shape=(), dtype=onp.float64):
     A random array with the specified shape and dtype.
   """
   dtype = xla_bridge.canonicalize_dtype(dtype)
+  shape = shape or onp.shape(df)
+  _check_shape("t", shape)
+  if onp.isscalar(df):
+    # halve a scalar df on the host rather than in the traced computation
+    return _t_from_half_df(key, onp.array(df / 2, dtype), shape, dtype)
   return _t(key, df, shape, dtype)
 
 @partial(jit, static_argnums=(2, 3))
 def _t(key, df, shape, dtype):
-  _check_shape("t", shape)
   df = lax.convert_element_type(df, dtype)
-  shape = shape or onp.shape(df)
+  half_df = lax.div(df, _constant_like(df, 2))
+  return _t_sample(key, half_df, shape, dtype)
+
+@partial(jit, static_argnums=(2, 3))
+def _t_from_half_df(key, half_df, shape, dtype):
+  return _t_sample(key, half_df, shape, dtype)
+
+def _t_sample(key, half_df, shape, dtype):
   key_n, key_g = split(key)
-  n = normal(key_n, shape, dtype)
-  two = _constant_like(n, 2)
-  half_df = lax.div(df, two)
-  g = gamma(key_n, half_df, shape, dtype)
-  return n * np.sqrt(half_df / g)
+  # Sample through _normal_from_bits and _gamma_impl directly rather than the
+  # jitted wrappers, so that both draws and the trailing arithmetic are traced
+  # into one computation and XLA can fuse the elementwise tail.
+  n = _normal_from_bits(_random_bits(key_n, onp.finfo(dtype).bits, shape), dtype)
+  # only the gamma sampler needs the shape parameter at the full shape
+  g = _gamma_impl(key_g, np.broadcast_to(half_df, shape))
+  # n * sqrt(half_df / g), with the division folded into a reciprocal sqrt
+  return lax.mul(lax.mul(n, _promote_rank(lax.sqrt(half_df), shape)),
+                 lax.rsqrt(g))
+
+
+def t_batched(keys, df, shape=(), dtype=onp.float64):
+  """Sample Student's t random values for each PRNG key in a batch.
+
+  The result matches stacking `t(key, df, shape, dtype)` for each key in
+  `keys`. The batch is traced and dispatched as a single computation, which is
+  much cheaper than calling `t` in a Python loop when drawing many small
+  samples.
+
+  Args:
+    keys: an array of PRNGKeys with shape `(n, 2)`.
+    df: an array-like broadcastable to `shape` and used as the shape parameter
+      of the random variables.
+    shape: optional, a tuple of nonnegative integers representing the shape
+      drawn for each key (default scalar).
+    dtype: optional, a float dtype for the returned values (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+
+  Returns:
+    A random array with shape `(n,) + shape` and the specified dtype.
+  """
+  dtype = xla_bridge.canonicalize_dtype(dtype)
+  shape = shape or onp.shape(df)
+  _check_shape("t_batched", shape)
+  return _t_batched(keys, df, shape, dtype)
+
+@partial(jit, static_argnums=(2, 3))
+def _t_batched(keys, df, shape, dtype):
+  df = lax.convert_element_type(df, dtype)
+  half_df = lax.div(df, _constant_like(df, 2))
+  return vmap(lambda key: _t_sample(key, half_df, shape, dtype))(keys)
+
+
+def precompile_t(shapes, dtypes=(onp.float64,), df=1.):
+  """Traces and compiles `t` ahead of time for the given shapes and dtypes.
+
+  The first call of `t` with a new shape and dtype pays for tracing and
+  compiling a computation, which for small shapes costs much more than the
+  sampling itself. Calling this at startup with the shapes a program samples
+  moves that cost out of the first real call.
+
+  Args:
+    shapes: an iterable of sample shapes.
+    dtypes: optional, an iterable of float dtypes (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+    df: optional, a value of the same kind (Python scalar, or array of the same
+      shape and dtype) as the `df` later passed to `t` (default 1.).
+  """
+  key = PRNGKey(0)
+  for shape in shapes:
+    for dtype in dtypes:
+      t(key, df, tuple(shape), dtype)
@@ -160,8 +160,8 @@ def split_merge(predicate, xs):
 
   return lhs, rhs, merge
 
-def cache(max_size=4096):
-  return fastcache.clru_cache(maxsize=max_size)
+def cache(max_size=4096, typed=False):
+  return fastcache.clru_cache(maxsize=max_size, typed=typed)
 
 memoize = fastcache.clru_cache(maxsize=None)
 
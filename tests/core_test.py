@@ -26,6 +26,8 @@ from absl.testing import parameterized
 
 from jax import api
 from jax import core
+from jax import lax
+from jax import linear_util as lu
 from jax import numpy as np
 from jax import test_util as jtu
 from jax.api import jvp, linearize, vjp, jit
@@ -255,6 +257,91 @@ class CoreTest(jtu.JaxTestCase):
     assert d2_sin(0.0) == 0.0
     assert d3_sin(0.0) == -1.0
 
+  def test_jaxpr_to_python(self):
+    def f(x, y):
+      return [call(lambda z: np.sin(z) * y, x + 1.) + 2., np.cos(y)]
+
+    pvals = [__, __]
+    jaxpr, _, consts = pe.trace_to_jaxpr(lu.wrap_init(f), pvals,
+                                         instantiate=True)
+    fun = core.jaxpr_to_python(jaxpr)
+    self.assertIs(fun, core.jaxpr_to_python(jaxpr))
+
+    args = (onp.float32(0.5), onp.float32(2.))
+    self.assertAllClose(fun(consts, (), *args),
+                        core.eval_jaxpr(jaxpr, consts, (), *args),
+                        check_dtypes=True)
+    self.assertAllClose(fun(consts, (), *args), f(*args), check_dtypes=True)
+
+  def test_jaxpr_to_python_many_operands(self):
+    def f(*xs):
+      return lax.concatenate(xs, 0)
+
+    num_args = 300
+    pval = pe.PartialVal((ShapedArray((1,), onp.float32), core.unit))
+    jaxpr, _, consts = pe.trace_to_jaxpr(lu.wrap_init(f), [pval] * num_args,
+                                         instantiate=True)
+    args = [onp.full((1,), i, onp.float32) for i in range(num_args)]
+    self.assertAllClose(core.jaxpr_to_python(jaxpr)(consts, (), *args),
+                        core.eval_jaxpr(jaxpr, consts, (), *args),
+                        check_dtypes=True)
+
+  def test_bind_many(self):
+    ans = lax.mul_p.bind_many([(1., 2.), (3., 4.)])
+    self.assertAllClose(ans, [2., 12.], check_dtypes=False)
+
+    def f(x):
+      return tuple(lax.mul_p.bind_many([(x, x), (x, 2.)]))
+    primals, tangents = jvp(f, (3.,), (1.,))
+    self.assertAllClose(primals, (9., 6.), check_dtypes=False)
+    self.assertAllClose(tangents, (6., 2.), check_dtypes=False)
+    self.assertAllClose(jit(f)(3.), (9., 6.), check_dtypes=False)
+
+  def test_primitive_result_cache(self):
+    calls = []
+    def impl(x, y):
+      calls.append((x, y))
+      return x + y
+
+    p = core.Primitive('cached_add')
+    p.def_impl(impl)
+    p.enable_result_cache()
+
+    self.assertEqual(p.bind(1, 2), 3)
+    self.assertEqual(p.bind(1, 2), 3)
+    self.assertEqual(len(calls), 1)
+
+    x = onp.arange(3.)
+    self.assertAllClose(p.bind(x, x), 2 * x, check_dtypes=True)
+    self.assertAllClose(p.bind(x, x), 2 * x, check_dtypes=True)
+    self.assertEqual(len(calls), 3)
+
+    # equal values of different types must not share a cache entry
+    for x, y in [(1., 2.), (True, 2), (onp.float32(1), onp.float32(2))]:
+      ans = p.bind(x, y)
+      self.assertEqual(type(ans), type(x + y))
+      self.assertEqual(ans, 3)
+    self.assertEqual(len(calls), 6)
+    self.assertEqual(type(p.bind(1, 2)), int)
+    self.assertEqual(len(calls), 6)
+
+    # bind_many goes through the same cache
+    self.assertEqual(p.bind_many([(1, 2), (1., 2.)]), [3, 3.])
+    self.assertEqual(len(calls), 6)
+
+  def test_primitive_result_cache_impl_type_error(self):
+    calls = []
+    def impl(x):
+      calls.append(x)
+      raise TypeError("raised by impl")
+
+    p = core.Primitive('cached_raise')
+    p.def_impl(impl)
+    p.enable_result_cache()
+
+    self.assertRaisesRegexp(TypeError, "raised by impl", lambda: p.bind(1))
+    self.assertEqual(len(calls), 1)
+
 
 if __name__ == '__main__':
   absltest.main()
@@ -95,6 +95,44 @@ class LaxRandomTest(jtu.JaxTestCase):
         onp.uint32([0x243f6a88, 0x85a308d3]))
     self.assertEqual(expected, result_to_hex(result))
 
+  def testPhilox4x32(self):
+    # Known values from the test vectors of the Random123 reference
+    # implementation, see kat_vectors in https://github.com/DEShawResearch/random123
+    def result_to_hex(result):
+      return tuple([hex(x.copy()).rstrip("L") for x in result])
+
+    expected = ("0x6627e8d5", "0xe169c58d", "0xbc57ac4c", "0x9b00dbd8")
+    result = random.philox_4x32(onp.uint32([0, 0]), onp.uint32([0, 0, 0, 0]))
+    self.assertEqual(expected, result_to_hex(result))
+
+    expected = ("0x408f276d", "0x41c83b0e", "0xa20bc7c6", "0x6d5451fd")
+    result = random.philox_4x32(onp.uint32([-1, -1]), onp.uint32([-1] * 4))
+    self.assertEqual(expected, result_to_hex(result))
+
+    expected = ("0xd16cfe09", "0x94fdcceb", "0x5001e420", "0x24126ea1")
+    result = random.philox_4x32(
+        onp.uint32([0xa4093822, 0x299f31d0]),
+        onp.uint32([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344]))
+    self.assertEqual(expected, result_to_hex(result))
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_size={}".format(size), "size": size}
+      for size in [1, 2, 7, 10])
+  def testPhilox4x32Indexed(self, size):
+    key = random.PRNGKey(0)
+    expected = random.philox_4x32(key, onp.arange(size, dtype=onp.uint32))
+    result = random._philox_4x32_indexed(key, size)
+    self.assertAllClose(expected, result, check_dtypes=True)
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_size={}".format(size), "size": size}
+      for size in [1, 2, 7, 10])
+  def testThreefry2x32Indexed(self, size):
+    key = random.PRNGKey(0)
+    expected = random.threefry_2x32(key, onp.arange(size, dtype=onp.uint32))
+    result = random._threefry_2x32_indexed(key, size)
+    self.assertAllClose(expected, result, check_dtypes=True)
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_{}".format(dtype), "dtype": onp.dtype(dtype).name}
       for dtype in [onp.float32, onp.float64]))
@@ -269,6 +307,15 @@ class LaxRandomTest(jtu.JaxTestCase):
     x = random.gamma(key, onp.array([0.2, 0.3]), shape=(3, 2))
     assert x.shape == (3, 2)
 
+  def testGammaNoRankPromotion(self):
+    try:
+      prev_flag = FLAGS.jax_numpy_rank_promotion
+      FLAGS.jax_numpy_rank_promotion = "raise"
+      x = random.gamma(random.PRNGKey(0), onp.array([0.2, 3.]), shape=(3, 2))
+      self.assertEqual(x.shape, (3, 2))
+    finally:
+      FLAGS.jax_numpy_rank_promotion = prev_flag
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_a={}".format(alpha), "alpha": alpha}
       for alpha in [1e-4, 1e-3, 1e-2, 1e-1, 1e0, 1e1, 1e2, 1e3, 1e4]))
@@ -286,6 +333,13 @@ class LaxRandomTest(jtu.JaxTestCase):
 
     self.assertAllClose(actual_grad, expected_grad, check_dtypes=True, rtol=0.0005)
 
+  def testGammaGradOneSecondDerivative(self):
+    # one point in each of the four regions of _gamma_grad_one
+    z = onp.array([0.5, 5., 20., 2.], onp.float32)
+    alpha = onp.array([2., 20., 20., 3.], onp.float32)
+    d2z = api.vmap(api.grad(random._gamma_grad_one))(z, alpha)
+    self.assertTrue(onp.all(onp.isfinite(d2z)))
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_{}".format(dtype), "dtype": onp.dtype(dtype).name}
       for dtype in [onp.float32, onp.float64]))
@@ -366,6 +420,41 @@ class LaxRandomTest(jtu.JaxTestCase):
     for samples in [uncompiled_samples, compiled_samples]:
       self._CheckKolmogorovSmirnovCDF(samples, scipy.stats.t(df).cdf)
 
+  def testParetoBatched(self):
+    keys = random.split(random.PRNGKey(0), 3)
+    b = onp.array([0.2, 0.3])
+    expected = onp.stack([random.pareto(key, b, (4, 2)) for key in keys])
+    result = random.pareto_batched(keys, b, (4, 2))
+    self.assertAllClose(expected, result, check_dtypes=True)
+
+  def testPrecompilePareto(self):
+    key = random.PRNGKey(0)
+    shapes = [(3,), (2, 2)]
+    random.precompile_pareto(shapes, [onp.float32], b=2.)
+    for shape in shapes:
+      with api.disable_jit():
+        expected = random.pareto(key, 2., shape, onp.float32)
+      result = random.pareto(key, 2., shape, onp.float32)
+      self.assertAllClose(expected, result, check_dtypes=True)
+
+  @jtu.skip_on_devices("cpu", "tpu")  # TODO(phawkins): slow compilation times
+  def testPrecompileT(self):
+    key = random.PRNGKey(0)
+    shapes = [(3,), (2, 2)]
+    random.precompile_t(shapes, [onp.float32], df=3.)
+    for shape in shapes:
+      with api.disable_jit():
+        expected = random.t(key, 3., shape, onp.float32)
+      result = random.t(key, 3., shape, onp.float32)
+      self.assertAllClose(expected, result, check_dtypes=True)
+
+  def testTBatched(self):
+    keys = random.split(random.PRNGKey(0), 3)
+    df = onp.array([1., 10.])
+    expected = onp.stack([random.t(key, df, (4, 2)) for key in keys])
+    result = random.t_batched(keys, df, (4, 2))
+    self.assertAllClose(expected, result, check_dtypes=True)
+
   def testIssue222(self):
     x = random.randint(random.PRNGKey(10003), (), 0, 0)
     assert x == 0